@@ -10,12 +10,10 @@
 """
 
 from pathlib import Path
+import os
 import sys
-import shutil
-import datetime
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import re
+from _fileops import MAX_WORKERS, MONTH_RE, scan_months, day_str, ensure_dir, same_device, run_batches
 
 # -------------------- 通用函数 --------------------
 def get_script_dir() -> Path:
@@ -24,37 +22,11 @@ def get_script_dir() -> Path:
         return Path(sys.executable).parent
     return Path(__file__).parent.resolve()
 
-def move_file(src: str, dst: Path, copy_only: bool = False) -> None:
-    """
-    移动或复制单个文件，处理重名情况
-    """
-    src_path = Path(src)
-    
-    # 如果目标文件已存在，则进行重命名
-    counter = 1
-    target = dst
-    while target.exists():
-        stem = target.stem
-        suffix = target.suffix
-        # 如果已存在，则在文件名后加上计数器
-        target = target.with_name(f"{stem}({counter}){suffix}")
-        counter += 1
-
-    try:
-        if copy_only:
-            # 复制文件（保留原文件）
-            shutil.copy2(str(src_path), str(target))
-        else:
-            # 移动文件（剪切）
-            shutil.move(str(src_path), str(target))
-    except Exception as e:
-        print(f'[ERROR] {"复制" if copy_only else "移动"}失败：{src_path} -> {target}  {e}')
-
 # -------------------- 主流程 --------------------
 def main() -> None:
     # 让用户输入微信文件夹路径（包含月份文件夹的目录）
     folder_path = input('请输入微信文件夹路径（包含月份文件夹的目录）：').strip()
-    file_dir = Path(folder_path)
+    file_dir = Path(folder_path).resolve()  # 只解析一次，扫描得到的路径即为绝对路径
     
     if not file_dir.is_dir():
         print('| 路径无效，程序退出')
@@ -62,22 +34,15 @@ def main() -> None:
 
     # 扫描月份文件夹 (格式: YYYY-MM)
     month_dirs = [p for p in file_dir.iterdir() 
-                 if p.is_dir() and re.match(r'\d{4}-\d{2}', p.name)]
+                 if p.is_dir() and MONTH_RE(p.name)]
     print(f'| 发现 {len(month_dirs)} 个月份文件夹: {[d.name for d in month_dirs]}')
 
     # 按文件类型分类
     files_by_type = defaultdict(list)
-    for month_folder in month_dirs:
+    for month_folder, part in scan_months(month_dirs, use_processes=True):
         print(f'| 扫描文件夹: {month_folder.name}')
-        for file_path in month_folder.rglob('*'):
-            if file_path.is_file():
-                # 处理文件后缀
-                suffix = file_path.suffix.lower()
-                if suffix:  # 有后缀名
-                    suffix = suffix[1:]  # 去掉点号
-                else:  # 无后缀名
-                    suffix = 'no_ext'
-                files_by_type[suffix].append(str(file_path.resolve()))
+        for suffix, files in part.items():
+            files_by_type[suffix].extend(files)
 
     # 计算总文件数
     total_files = sum(len(v) for v in files_by_type.values())
@@ -103,32 +68,46 @@ def main() -> None:
 
     # 创建类型目录（一级分类：按后缀）
     type_dir_map = {}
+    made = set()  # 本次运行已创建的目录
+    files_root = os.path.join(str(out_root), 'Files')
     for suf in files_by_type.keys():
-        target = out_root / 'Files' / suf
-        target.mkdir(parents=True, exist_ok=True)
-        type_dir_map[suf] = target
+        type_dir_map[suf] = ensure_dir(os.path.join(files_root, suf), made)
+    # 源目录与输出目录是否同盘，决定移动时能否直接 rename
+    same_dev = same_device(file_dir, out_root) if type_dir_map else True
+    if not keep_original:
+        if same_dev:
+            print('| 源目录与输出目录位于同一磁盘，直接重命名移动')
+        else:
+            print('| 源目录与输出目录位于不同磁盘，复制后删除源文件')
 
     # 准备任务列表
     tasks = []
+    # (后缀, 日期) -> 日期目录，每个目录只创建一次
+    bucket_cache = {}
     for suf, file_list in files_by_type.items():
         type_dir = type_dir_map[suf]  # 一级目录：Files/<后缀>
-        for src in file_list:
-            src_path = Path(src)
+        for src, base, mtime in file_list:
             # 根据选择决定是否添加日期子目录（二级分类）
-            if use_date_category:
+            if use_date_category and mtime is None:
+                # 扫描时未能取得修改时间
+                print(f'[警告] 无法获取文件 {src} 的日期信息，将直接保存到类型目录')
+                dst = type_dir + os.sep + base
+            elif use_date_category:
                 try:
-                    # 获取文件修改时间
-                    mtime = src_path.stat().st_mtime
-                    date_str = datetime.datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
-                    date_dir = type_dir / date_str  # 二级目录：Files/<后缀>/YYYY-MM-DD
-                    date_dir.mkdir(parents=True, exist_ok=True)
-                    dst = date_dir / src_path.name
+                    # 使用扫描阶段取得的修改时间
+                    date_str = day_str(mtime)
+                    date_dir = bucket_cache.get((suf, date_str))
+                    if date_dir is None:
+                        date_dir = type_dir + os.sep + date_str  # 二级目录：Files/<后缀>/YYYY-MM-DD
+                        ensure_dir(date_dir, made)
+                        bucket_cache[(suf, date_str)] = date_dir
+                    dst = date_dir + os.sep + base
                 except Exception as e:
                     print(f'[警告] 无法获取文件 {src} 的日期信息，将直接保存到类型目录：{e}')
-                    dst = type_dir / src_path.name
+                    dst = type_dir + os.sep + base
             else:
                 # 不按日期分类，直接保存到类型目录
-                dst = type_dir / src_path.name
+                dst = type_dir + os.sep + base
             tasks.append((src, dst, keep_original))
 
     if not tasks:
@@ -137,20 +116,21 @@ def main() -> None:
 
     # 执行多线程处理
     print(f'| 开始处理 {len(tasks)} 个文件...')
-    WORKERS = min(32, len(tasks))
+    WORKERS = min(MAX_WORKERS, len(tasks))
+    # 按目标目录排序，让同一目录的文件连续处理、落在同一批次里
+    tasks.sort(key=lambda t: t[1].rpartition(os.sep)[0])
+    # 按批经有界队列分发任务，工作线程边派发边处理
+    chunk = max(1, len(tasks) // (WORKERS * 16))
     completed = 0
-    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
-        futures = [pool.submit(move_file, src, dst, copy_only) for src, dst, copy_only in tasks]
-        for fut in as_completed(futures):
-            completed += 1
-            # 每完成 100 个或最后一个任务时打印进度
-            if completed % 100 == 0 or completed == len(tasks):
-                print(f'| 已完成 {completed}/{len(tasks)}')
-            # 获取任务结果（捕获异常用）
-            try:
-                fut.result()
-            except Exception as e:
-                print(f'[错误] {e}')
+    for errors in run_batches(tasks, chunk, WORKERS, same_dev):
+        for err in errors:
+            if err is not None:
+                print(f'[错误] {err}')
+        last = completed
+        completed += len(errors)
+        # 每完成 100 个或最后一个任务时打印进度
+        if completed // 100 != last // 100 or completed == len(tasks):
+            print(f'| 已完成 {completed}/{len(tasks)}')
 
     # 全部任务完成提示
     print('| 全部操作完成！')
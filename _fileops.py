@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+文件操作公共函数：目录遍历、同名不覆盖的移动/复制，供 GUI 与命令行版本共用
+"""
+
+import os
+import sys
+import shutil
+import ctypes
+import errno
+import platform
+import re
+import datetime
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    # 可选的 Cython 加速模块（见 fastmove.pyx），未构建时使用 ctypes
+    from fastmove import fast_move as _fast_move
+except ImportError:
+    _fast_move = None
+
+# 月份文件夹名匹配 (格式: YYYY-MM)
+MONTH_RE = re.compile(r'\d{4}-\d{2}').match
+
+def walk_files(root: str):
+    """非递归遍历目录树，逐个产出文件的 DirEntry（不跟随符号链接）"""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            # 无权限等无法读取的目录直接跳过，与 rglob/os.walk 一致
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+def scan_month(root: str, with_mtime: bool = True) -> dict:
+    """
+    扫描单个月份目录，返回 {后缀: [(路径, 文件名, 修改时间), ...]}
+    with_mtime 为假或无法获取时修改时间记为 None
+    """
+    files_by_type = {}
+    for entry in walk_files(root):
+        # 处理文件后缀
+        head, _, ext = entry.name.rpartition('.')
+        # 无后缀名（含 .开头的隐藏文件）归入 no_ext
+        suffix = ext.lower() if head and ext else 'no_ext'
+        # 仅在按日期分类时才需要修改时间（Windows 下扫描时已顺带取得）
+        mtime = None
+        if with_mtime:
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                # 扫描后被删除或锁定的文件记为 None，由调用方放入类型目录
+                pass
+        files_by_type.setdefault(suffix, []).append((entry.path, entry.name, mtime))
+    return files_by_type
+
+# 月份目录数达到该值才启用多进程扫描。多进程的额外开销包括进程启动，以及把结果序列化回传，
+# 后者随文件数增长（单核实测：3.2 万文件约多 0.05 s，16 万文件约多 0.18 s），
+# 只有多个核同时扫描不同月份目录时才能抵消；至少一年的月份目录才能让各进程分到多个目录
+PROCESS_SCAN_MIN_DIRS = 12
+
+def _use_process_scan(month_dirs: list) -> bool:
+    """
+    判断是否值得多进程扫描：只看月份目录数与 CPU 数，不额外遍历目录。
+    Windows 与打包后的 exe 始终在本进程内扫描——spawn 会在每个子进程重新导入
+    主模块（含 PyQt5），而 Windows 下 DirEntry.stat() 本身几乎没有开销
+    """
+    if os.name == 'nt' or getattr(sys, 'frozen', False):
+        return False
+    # 单核机器上只有一个工作进程，只会多出启动与回传开销
+    if (os.cpu_count() or 1) < 2:
+        return False
+    return len(month_dirs) >= PROCESS_SCAN_MIN_DIRS
+
+def scan_months(month_dirs: list, with_mtime: bool = True, use_processes: bool = False):
+    """
+    按顺序逐个产出 (月份目录, scan_month 结果)；提前关闭生成器会取消尚未开始的扫描
+    use_processes 为真且目录较多时用多进程并行扫描。只应在单线程的命令行版本中开启：
+    在 GUI 的 QThread 里 fork 多线程的 Qt 进程可能死锁
+    """
+    if not (use_processes and _use_process_scan(month_dirs)):
+        for month_folder in month_dirs:
+            yield month_folder, scan_month(str(month_folder), with_mtime)
+        return
+    workers = min(len(month_dirs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pp:
+        futures = [pp.submit(scan_month, str(p), with_mtime) for p in month_dirs]
+        try:
+            for month_folder, fut in zip(month_dirs, futures):
+                yield month_folder, fut.result()
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+# 15 分钟时间片 -> 本地日期字符串。现行各时区偏移及夏令时切换都落在 15 分钟整点上，
+# 同一时间片内的本地日期相同（早年的地方平时偏移不在此列，对文件修改时间无实际影响）
+_day_cache = {}
+
+def day_str(mtime: float) -> str:
+    """把修改时间转换为本地日期字符串 YYYY-MM-DD（带缓存）"""
+    key = int(mtime // 900)
+    s = _day_cache.get(key)
+    if s is None:
+        s = datetime.date.fromtimestamp(mtime).isoformat()
+        _day_cache[key] = s
+    return s
+
+# I/O 密集型任务的线程数上限
+MAX_WORKERS = min(32, (os.cpu_count() or 4) * 5)
+
+# Linux renameat2 所需常量；其他架构/系统走通用回退
+_SYS_RENAMEAT2 = {'x86_64': 316, 'i386': 353, 'i686': 353, 'aarch64': 276,
+                  'armv7l': 382, 'riscv64': 276}.get(platform.machine())
+_AT_FDCWD = -100
+_RENAME_NOREPLACE = 1
+_syscall = None
+_renameat2_ok = sys.platform.startswith('linux') and (_fast_move is not None or _SYS_RENAMEAT2 is not None)
+
+def _renameat2(src: str, dst: str) -> bool:
+    """
+    Linux 下以 RENAME_NOREPLACE 原子重命名，目标已存在时抛 FileExistsError；
+    系统或文件系统不支持时返回 False
+    """
+    global _syscall, _renameat2_ok
+    if not _renameat2_ok:
+        return False
+    if _fast_move is not None:
+        err = _fast_move(os.fsencode(src), os.fsencode(dst))
+    else:
+        if _syscall is None:
+            try:
+                # 取当前进程已加载的 C 库，不依赖 glibc 的库文件名（兼容 musl 等）
+                _syscall = ctypes.CDLL(None, use_errno=True).syscall
+            except (OSError, AttributeError):
+                # 无法加载时不再尝试，改走 link/unlink
+                _renameat2_ok = False
+                return False
+        ret = _syscall(_SYS_RENAMEAT2, _AT_FDCWD, os.fsencode(src),
+                       _AT_FDCWD, os.fsencode(dst), _RENAME_NOREPLACE)
+        err = 0 if ret == 0 else ctypes.get_errno()
+    if err == 0:
+        return True
+    if err in (errno.ENOSYS, errno.EINVAL):
+        # 内核或文件系统不支持该标志，之后不再尝试
+        _renameat2_ok = False
+        return False
+    raise OSError(err, os.strerror(err), src, None, dst)
+
+def _rename_noreplace(src: str, dst: str) -> None:
+    """同盘重命名，目标已存在时抛 FileExistsError 而不是覆盖"""
+    if _renameat2(src, dst):
+        return
+    if os.name == 'nt':
+        # Windows 的 rename 本身就不会覆盖已有文件
+        os.rename(src, dst)
+    else:
+        os.link(src, dst)
+        try:
+            os.unlink(src)
+        except OSError:
+            os.unlink(dst)
+            raise
+
+def _reserve(dst: str) -> None:
+    """以独占方式创建空文件占住目标名，已存在时抛 FileExistsError"""
+    os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+
+def _copy_file(src: str, dst: str) -> None:
+    """复制文件内容及元数据；Linux 下优先用 copy_file_range 在内核内完成"""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        break
+                    remaining -= n
+            shutil.copystat(src, dst)
+            return
+        except OSError as e:
+            # 内核或文件系统不支持时退回到 shutil.copy2
+            if e.errno not in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    # Python 3.8+ 的 shutil.copy2 在 Linux 上已通过 os.sendfile 在内核内复制，
+    # macOS 上用 fcopyfile，无需再自行实现 sendfile 循环
+    shutil.copy2(src, dst)
+
+def ensure_dir(path: str, made: set) -> str:
+    """
+    确保目录存在并返回该路径；made 记录本次运行已创建的目录，
+    命中时不再发起系统调用，父目录已创建时只需一次 mkdir
+    """
+    if path not in made:
+        if os.path.dirname(path) in made:
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                # 同名的普通文件不能当作目录使用
+                if not os.path.isdir(path):
+                    raise
+        else:
+            os.makedirs(path, exist_ok=True)
+        made.add(path)
+    return path
+
+def same_device(a, b) -> bool:
+    """判断两个路径是否位于同一设备（同盘时移动只需一次 rename）"""
+    return os.stat(a).st_dev == os.stat(b).st_dev
+
+def move_fast(src: str, dst: str, copy_only: bool, same_dev: bool) -> None:
+    """
+    把单个文件移动/复制到 dst，dst 已存在时抛 FileExistsError
+    same_dev 为真时直接 rename，否则走复制（+删除源文件）
+    """
+    if not copy_only and same_dev:
+        try:
+            _rename_noreplace(src, dst)
+            return
+        except FileExistsError:
+            raise
+        except OSError:
+            # 不支持硬链接、子目录跨盘等情况，退回到占位 + 复制
+            pass
+    _reserve(dst)
+    try:
+        _copy_file(src, dst)
+        if not copy_only:
+            # 已知不能 rename，直接复制后删除源文件，省去 shutil.move 的探测
+            os.unlink(src)
+    except BaseException:
+        # 失败时清理占位文件
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        raise
+
+def move_file(src: str, dst: str, copy_only: bool = False, same_dev: bool = True) -> None:
+    """
+    移动或复制单个文件，处理重名情况
+    """
+    stem, suffix = os.path.splitext(dst)
+    counter = 0
+    target = dst
+    while True:
+        try:
+            move_fast(src, target, copy_only, same_dev)
+            return
+        except FileExistsError:
+            # 如果已存在，则在文件名后加上计数器
+            counter += 1
+            target = f"{stem}({counter}){suffix}"
+        except Exception as e:
+            raise Exception(f'{"复制" if copy_only else "移动"}失败：{src} -> {target}  {e}')
+
+def move_batch(batch: list, same_dev: bool = True) -> list:
+    """
+    依次处理一批 (src, dst, copy_only) 任务，返回每个任务的错误信息（成功为 None）
+    """
+    errors = []
+    for src, dst, copy_only in batch:
+        try:
+            move_file(src, dst, copy_only, same_dev)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e))
+    return errors
+
+def run_batches(tasks: list, chunk: int, workers: int, same_dev: bool = True):
+    """
+    把任务按 chunk 个一批经有界队列分给 workers 个工作线程，
+    按完成顺序逐批产出 move_batch 的错误列表；提前关闭生成器会停止派发剩余批次
+    """
+    task_q = queue.Queue(maxsize=workers * 4)
+    result_q = queue.Queue()
+    stop = threading.Event()
+
+    def worker():
+        while True:
+            batch = task_q.get()
+            if batch is None:
+                break
+            # 已取消的批次直接跳过
+            result_q.put(None if stop.is_set() else move_batch(batch, same_dev))
+
+    def feeder():
+        for i in range(0, len(tasks), chunk):
+            if stop.is_set():
+                break
+            task_q.put(tasks[i:i + chunk])
+        for _ in range(workers):
+            task_q.put(None)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    threads.append(threading.Thread(target=feeder, daemon=True))
+    for t in threads:
+        t.start()
+    try:
+        for _ in range(0, len(tasks), chunk):
+            yield result_q.get()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -11,6 +11,7 @@ import sys
 from os.path import dirname as opdirname
 from os.path import abspath as opabspath
 from os.path import join as opjoin
+from os.path import basename as opbasename
 import shutil
 
 # 示例路径：D:\minic\Documents\xwechat_files\wxid_wogvv1239spm22_9381\msg\file\2025-06
@@ -19,7 +20,7 @@ import shutil
 FolderPath = input("请输入路径：")
 
 # 往上退一级，得到“file”目录，后面所有月份文件夹都在它里面
-file_dir = Path(FolderPath).parent
+file_dir = Path(FolderPath).parent.resolve()
 
 # 所有子文件夹路径列表
 sub_dirs = [p for p in file_dir.iterdir() if p.is_dir()]
@@ -34,7 +35,7 @@ files_by_type = defaultdict(list)
 for folder in sub_dirs:                # 之前已经拿到的 file/2025-06 这类目录
     for file in folder.rglob('*'):     # rglob 递归遍历，只要当前层用 glob('*')
         if file.is_file():             # 只处理文件，跳过子目录
-            files_by_type[file.suffix.lstrip('.')].append(str(file.resolve()))   # 绝对路径
+            files_by_type[file.suffix.lstrip('.')].append(str(file))   # file_dir 已是绝对路径
 
 # 文件类型列表
 Suffixs = list(files_by_type.keys())
@@ -74,7 +75,7 @@ for suffix, file_list in files_by_type.items():
     for src in file_list:
         
         # 拼接目标文件完整路径
-        dst = Path(target_root) / Path(src).name
+        dst = opjoin(target_root, opbasename(src))
         
         # 执行移动（剪切）
         shutil.move(src, dst)
\ No newline at end of file
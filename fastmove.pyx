@@ -0,0 +1,32 @@
+# cython: language_level=3
+"""
+可选的编译加速模块：释放 GIL 后直接调用 renameat2(RENAME_NOREPLACE)
+仅适用于 Linux，构建：cythonize -i fastmove.pyx
+未构建时 _fileops 自动退回到 ctypes 实现
+"""
+
+from libc.errno cimport errno
+
+cdef extern from "<fcntl.h>":
+    int AT_FDCWD
+
+cdef extern from "<sys/syscall.h>":
+    long SYS_renameat2
+
+cdef extern from "<unistd.h>" nogil:
+    long syscall(long number, ...)
+
+cdef enum:
+    _RENAME_NOREPLACE = 1
+
+def fast_move(bytes src, bytes dst):
+    """
+    以 RENAME_NOREPLACE 重命名 src -> dst，成功返回 0，失败返回 errno
+    """
+    cdef const char *s = src
+    cdef const char *d = dst
+    cdef int err = 0
+    with nogil:
+        if syscall(SYS_renameat2, AT_FDCWD, s, AT_FDCWD, d, _RENAME_NOREPLACE) != 0:
+            err = errno
+    return err
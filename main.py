@@ -1,15 +1,12 @@
 import sys
 import os
-import datetime
-import re
 from pathlib import Path
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox
 from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from MainUi_ui import Ui_MainWindow
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from PyQt5 import QtGui
-import shutil
+from _fileops import MAX_WORKERS, MONTH_RE, scan_months, day_str, ensure_dir, same_device, run_batches
 
 def get_script_dir() -> Path:
     """获取脚本（或打包后 exe）所在目录"""
@@ -17,32 +14,6 @@ def get_script_dir() -> Path:
         return Path(sys.executable).parent
     return Path(__file__).parent.resolve()
 
-def move_file(src: str, dst: Path, copy_only: bool = False) -> None:
-    """
-    移动或复制单个文件，处理重名情况
-    """
-    src_path = Path(src)
-    
-    # 如果目标文件已存在，则进行重命名
-    counter = 1
-    target = dst
-    while target.exists():
-        stem = target.stem
-        suffix = target.suffix
-        # 如果已存在，则在文件名后加上计数器
-        target = target.with_name(f"{stem}({counter}){suffix}")
-        counter += 1
-
-    try:
-        if copy_only:
-            # 复制文件（保留原文件）
-            shutil.copy2(str(src_path), str(target))
-        else:
-            # 移动文件（剪切）
-            shutil.move(str(src_path), str(target))
-    except Exception as e:
-        raise Exception(f'{"复制" if copy_only else "移动"}失败：{src_path} -> {target}  {e}')
-
 class FileProcessingThread(QThread):
     """文件处理线程，避免UI卡顿"""
     progress_updated = pyqtSignal(int)
@@ -60,7 +31,7 @@ class FileProcessingThread(QThread):
     def run(self):
         try:
             # 验证输入路径
-            wechat_dir = Path(self.wechat_path)
+            wechat_dir = Path(self.wechat_path).resolve()  # 只解析一次，扫描得到的路径即为绝对路径
             if not wechat_dir.is_dir():
                 self.log_updated.emit("[错误] 微信文件夹路径无效")
                 self.finished.emit()
@@ -68,24 +39,19 @@ class FileProcessingThread(QThread):
 
             # 扫描月份文件夹 (格式: YYYY-MM)
             month_dirs = [p for p in wechat_dir.iterdir() 
-                         if p.is_dir() and re.match(r'\d{4}-\d{2}', p.name)]
+                         if p.is_dir() and MONTH_RE(p.name)]
             self.log_updated.emit(f"发现 {len(month_dirs)} 个月份文件夹: {[d.name for d in month_dirs]}")
 
             # 按文件类型分类
             files_by_type = defaultdict(list)
-            for month_folder in month_dirs:
+            scanner = scan_months(month_dirs, self.use_date_category)
+            for month_folder, part in scanner:
                 if not self.is_running:  # 检查是否需要终止
+                    scanner.close()
                     break
                 self.log_updated.emit(f"扫描文件夹: {month_folder.name}")
-                for file_path in month_folder.rglob('*'):
-                    if file_path.is_file():
-                        # 处理文件后缀
-                        suffix = file_path.suffix.lower()
-                        if suffix:  # 有后缀名
-                            suffix = suffix[1:]  # 去掉点号
-                        else:  # 无后缀名
-                            suffix = 'no_ext'
-                        files_by_type[suffix].append(str(file_path.resolve()))
+                for suffix, files in part.items():
+                    files_by_type[suffix].extend(files)
 
             if not self.is_running:
                 self.log_updated.emit("操作已取消")
@@ -108,32 +74,46 @@ class FileProcessingThread(QThread):
 
             # 创建类型目录（一级分类：按后缀）
             type_dir_map = {}
+            made = set()  # 本次运行已创建的目录
+            files_root = os.path.join(str(out_root), 'Files')
             for suf in files_by_type.keys():
-                target = out_root / 'Files' / suf
-                target.mkdir(parents=True, exist_ok=True)
-                type_dir_map[suf] = target
+                type_dir_map[suf] = ensure_dir(os.path.join(files_root, suf), made)
+            # 源目录与输出目录是否同盘，决定移动时能否直接 rename
+            same_dev = same_device(wechat_dir, out_root) if type_dir_map else True
+            if not self.keep_original:
+                if same_dev:
+                    self.log_updated.emit("源目录与输出目录位于同一磁盘，直接重命名移动")
+                else:
+                    self.log_updated.emit("源目录与输出目录位于不同磁盘，复制后删除源文件")
 
             # 准备任务列表
             tasks = []
+            # (后缀, 日期) -> 日期目录，每个目录只创建一次
+            bucket_cache = {}
             for suf, file_list in files_by_type.items():
                 type_dir = type_dir_map[suf]  # 一级目录：Files/<后缀>
-                for src in file_list:
-                    src_path = Path(src)
+                for src, base, mtime in file_list:
                     # 根据开关决定是否添加日期子目录（二级分类）
-                    if self.use_date_category:
+                    if self.use_date_category and mtime is None:
+                        # 扫描时未能取得修改时间
+                        self.log_updated.emit(f"[警告] 无法获取文件 {src} 的日期信息，将直接保存到类型目录")
+                        dst = type_dir + os.sep + base
+                    elif self.use_date_category:
                         try:
-                            # 获取文件修改时间
-                            mtime = src_path.stat().st_mtime
-                            date_str = datetime.datetime.fromtimestamp(mtime).strftime('%Y-%m-%d')
-                            date_dir = type_dir / date_str  # 二级目录：Files/<后缀>/YYYY-MM-DD
-                            date_dir.mkdir(parents=True, exist_ok=True)
-                            dst = date_dir / src_path.name
+                            # 使用扫描阶段取得的修改时间
+                            date_str = day_str(mtime)
+                            date_dir = bucket_cache.get((suf, date_str))
+                            if date_dir is None:
+                                date_dir = type_dir + os.sep + date_str  # 二级目录：Files/<后缀>/YYYY-MM-DD
+                                ensure_dir(date_dir, made)
+                                bucket_cache[(suf, date_str)] = date_dir
+                            dst = date_dir + os.sep + base
                         except Exception as e:
                             self.log_updated.emit(f"[警告] 无法获取文件 {src} 的日期信息，将直接保存到类型目录：{e}")
-                            dst = type_dir / src_path.name
+                            dst = type_dir + os.sep + base
                     else:
                         # 不按日期分类，直接保存到类型目录
-                        dst = type_dir / src_path.name
+                        dst = type_dir + os.sep + base
                     tasks.append((src, dst, self.keep_original))
 
             if not tasks:
@@ -144,29 +124,34 @@ class FileProcessingThread(QThread):
             # 执行多线程处理
             self.log_updated.emit(f"开始处理 {len(tasks)} 个文件...")
             completed = 0
-            WORKERS = min(32, len(tasks))  # 避免创建过多线程
-            with ThreadPoolExecutor(max_workers=WORKERS) as pool:
-                futures = [pool.submit(move_file, src, dst, copy_only) for src, dst, copy_only in tasks]
-                for fut in as_completed(futures):
-                    if not self.is_running:  # 检查取消状态
-                        # 尝试取消未完成的任务
-                        for f in futures:
-                            f.cancel()
-                        break
-                    
-                    # 处理可能出现的异常
-                    try:
-                        fut.result()
-                    except Exception as e:
-                        self.log_updated.emit(f"[错误] {str(e)}")
-                    
-                    completed += 1
-                    # 更新进度条
-                    progress = int((completed / len(tasks)) * 100)
+            last_progress = -1
+            WORKERS = min(MAX_WORKERS, len(tasks))  # 避免创建过多线程
+            # 按目标目录排序，让同一目录的文件连续处理、落在同一批次里
+            tasks.sort(key=lambda t: t[1].rpartition(os.sep)[0])
+            # 按批经有界队列分发任务，工作线程边派发边处理
+            chunk = max(1, len(tasks) // (WORKERS * 16))
+            results = run_batches(tasks, chunk, WORKERS, same_dev)
+            for errors in results:
+                if not self.is_running:  # 检查取消状态
+                    # 关闭结果生成器会停止派发剩余批次
+                    results.close()
+                    break
+
+                # 处理可能出现的异常（同一批的错误合并为一次日志）
+                failed = [f"[错误] {err}" for err in errors if err is not None]
+                if failed:
+                    self.log_updated.emit("\n".join(failed))
+
+                last = completed
+                completed += len(errors)
+                # 更新进度条（百分比变化时才发信号）
+                progress = completed * 100 // len(tasks)
+                if progress != last_progress:
                     self.progress_updated.emit(progress)
-                    # 每10个任务更新一次日志
-                    if completed % 10 == 0 or completed == len(tasks):
-                        self.log_updated.emit(f"已完成 {completed}/{len(tasks)}")
+                    last_progress = progress
+                # 每100个任务更新一次日志
+                if completed // 100 != last // 100 or completed == len(tasks):
+                    self.log_updated.emit(f"已完成 {completed}/{len(tasks)}")
 
             if self.is_running:
                 self.log_updated.emit("全部处理完成！")
@@ -218,7 +203,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             path = Path(dir_path)
             if path.is_dir():
                 month_dirs = [p for p in path.iterdir() 
-                             if p.is_dir() and re.match(r'\d{4}-\d{2}', p.name)]
+                             if p.is_dir() and MONTH_RE(p.name)]
                 if month_dirs:
                     self.append_log(f"检测到 {len(month_dirs)} 个月份文件夹")
                 else:
@@ -250,7 +235,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         path = Path(wechat_path)
         if path.is_dir():
             month_dirs = [p for p in path.iterdir() 
-                         if p.is_dir() and re.match(r'\d{4}-\d{2}', p.name)]
+                         if p.is_dir() and MONTH_RE(p.name)]
             if not month_dirs:
                 reply = QMessageBox.question(self, "确认", 
                                            "未检测到月份文件夹（格式：YYYY-MM），是否继续？",
@@ -268,9 +253,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.processing_thread = FileProcessingThread(
             wechat_path, output_path, keep_original, use_date_category
         )
-        self.processing_thread.progress_updated.connect(self.progressBar.setValue)
-        self.processing_thread.log_updated.connect(self.append_log)
-        self.processing_thread.finished.connect(self.on_process_finished)
+        # 跨线程信号显式排队到 UI 线程处理
+        self.processing_thread.progress_updated.connect(self.progressBar.setValue, Qt.QueuedConnection)
+        self.processing_thread.log_updated.connect(self.append_log, Qt.QueuedConnection)
+        self.processing_thread.finished.connect(self.on_process_finished, Qt.QueuedConnection)
         self.processing_thread.start()
 
     def cancel_processing(self):